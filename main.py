@@ -4,25 +4,36 @@
 # Production-Grade for Kaggle Competition + Professional Authentication System
 from dotenv import load_dotenv  # <--- ADD THIS
 load_dotenv()
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for
+from flask import Flask, Response, render_template, request, jsonify, session, redirect, url_for
+from flask.json.provider import DefaultJSONProvider
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.dialects import postgresql
 from flask_login import LoginManager, UserMixin, login_user, logout_user, login_required, current_user
 from flask_cors import CORS
-from werkzeug.security import generate_password_hash, check_password_hash
-from google import genai
-from google.genai import types
-from google.auth.transport.requests import Request
-from google.oauth2.id_token import verify_oauth2_token
-import json
+from flask_caching import Cache
+from flask_session import Session
+from celery import Celery
+from celery.signals import worker_process_init
+from cachetools import TTLCache
+from werkzeug.security import check_password_hash
+from argon2 import PasswordHasher
+from argon2.exceptions import InvalidHashError, VerificationError
+import orjson
 import os
+import asyncio
+import threading
 import time
 import random 
 import logging
 import traceback
 from datetime import datetime
-from functools import wraps
-from typing import Dict, List, Tuple, Optional
+from functools import lru_cache, wraps
+from typing import Callable, Dict, List, Literal, Tuple, Optional
 import secrets
+import hashlib
+import httpx
+import redis
+from pydantic import BaseModel, Field
 
 # ========== LOGGING SETUP ==========
 logging.basicConfig(
@@ -31,10 +42,42 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# ========== GEVENT (GUNICORN WORKERS) ==========
+# Gunicorn's gevent worker monkey-patches sockets before loading the app;
+# psycopg2 is a C extension, so it needs its own hook to yield while waiting on Postgres
+try:
+    from gevent import monkey
+    if monkey.is_module_patched('socket'):
+        from psycogreen.gevent import patch_psycopg
+        patch_psycopg()
+        logger.info("✅ gevent worker: psycopg2 patched for cooperative I/O")
+except ImportError:
+    pass
+
 # ========== FLASK APP INITIALIZATION ==========
 app = Flask(__name__)
 app.config['JSON_SORT_KEYS'] = False
 
+
+# ========== JSON SERIALIZATION ==========
+class OrJSONProvider(DefaultJSONProvider):
+    """jsonify/request.json backed by orjson (native datetime support, C encoder)"""
+    
+    def dumps(self, obj, **kwargs) -> str:
+        option = orjson.OPT_NAIVE_UTC
+        if kwargs.get('indent'):
+            option |= orjson.OPT_INDENT_2
+        if kwargs.get('sort_keys'):
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(obj, default=self.default, option=option).decode()
+    
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+
+app.json = OrJSONProvider(app)
+app.json.sort_keys = False
+
 # ========== DATABASE CONFIGURATION (SMART SWITCH) ==========
 # Checks if we are on Render (DATABASE_URL exists) or Local (sqlite)
 database_url = os.getenv('DATABASE_URL')
@@ -44,6 +87,14 @@ if database_url:
     if database_url.startswith("postgres://"):
         database_url = database_url.replace("postgres://", "postgresql://", 1)
     app.config['SQLALCHEMY_DATABASE_URI'] = database_url
+    # Pre-ping + short recycle so Render's idle-connection reaper never hands us a dead connection
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+        'pool_size': 10,
+        'max_overflow': 20,
+        'pool_recycle': 60,
+        'pool_pre_ping': True,
+        'pool_use_lifo': True
+    }
     logger.info("✅ Using Render PostgreSQL Database")
 else:
     # Fallback to SQLite for local testing
@@ -63,6 +114,57 @@ login_manager.login_view = 'login'
 # Enable CORS for API requests
 CORS(app, supports_credentials=True)
 
+# ========== TASK QUEUE CONFIGURATION (SMART SWITCH) ==========
+# Uses Redis on Render (REDIS_URL exists), otherwise runs tasks inline for local testing
+redis_url = os.getenv('REDIS_URL')
+
+celery = Celery(app.import_name)
+celery.conf.update(
+    task_track_started=True,
+    result_expires=3600,
+    # Keep task args with the result so a failed job can still be matched to its user
+    result_extended=True
+)
+
+if redis_url:
+    celery.conf.update(broker_url=redis_url, result_backend=redis_url)
+    logger.info("✅ Using Redis Task Queue")
+else:
+    # Eager mode: .delay() runs the task in-process and keeps the result for polling
+    celery.conf.update(
+        broker_url='memory://localhost/',
+        result_backend='cache+memory://',
+        task_always_eager=True,
+        task_store_eager_result=True
+    )
+    logger.info("⚠️ Running Pipeline Tasks Inline (no REDIS_URL)")
+
+# ========== RESULT CACHE (SMART SWITCH) ==========
+# Finished pipeline results keyed by normalized dilemma, shared by web and worker via Redis
+if redis_url:
+    app.config['CACHE_TYPE'] = 'RedisCache'
+    app.config['CACHE_REDIS_URL'] = redis_url
+else:
+    app.config['CACHE_TYPE'] = 'SimpleCache'
+
+cache = Cache(app)
+
+# ========== SESSION STORE (SMART SWITCH) ==========
+# Redis-backed sessions on Render (cookie carries only a signed session id), signed cookies locally
+redis_client = redis.from_url(redis_url) if redis_url else None
+
+if redis_client:
+    app.config['SESSION_TYPE'] = 'redis'
+    app.config['SESSION_REDIS'] = redis_client
+    app.config['SESSION_USE_SIGNER'] = True
+    app.config['SESSION_PERMANENT'] = False
+    Session(app)
+    logger.info("✅ Using Redis Session Store")
+
+# ========== PASSWORD HASHING ==========
+# Argon2id at OWASP minimums (19 MiB, 2 iterations, 1 lane)
+password_hasher = PasswordHasher(time_cost=2, memory_cost=19456, parallelism=1)
+
 # ========== DATABASE MODELS ==========
 
 class User(UserMixin, db.Model):
@@ -84,11 +186,29 @@ class User(UserMixin, db.Model):
     
     def set_password(self, password):
         """Hash and set password"""
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = password_hasher.hash(password)
+        if self.id is not None:
+            invalidate_user_cache(self.id)
     
     def check_password(self, password):
-        """Check password hash"""
-        return check_password_hash(self.password_hash, password)
+        """Check password hash (legacy werkzeug hashes are upgraded to argon2 on success)"""
+        if not self.password_hash:
+            return False
+        
+        if not self.password_hash.startswith('$argon2'):
+            if not check_password_hash(self.password_hash, password):
+                return False
+            self.set_password(password)
+            return True
+        
+        try:
+            password_hasher.verify(self.password_hash, password)
+        except (VerificationError, InvalidHashError):
+            return False
+        
+        if password_hasher.check_needs_rehash(self.password_hash):
+            self.set_password(password)
+        return True
     
     def to_dict(self):
         """Convert to dictionary for JSON response"""
@@ -97,16 +217,22 @@ class User(UserMixin, db.Model):
             'email': self.email,
             'name': self.name,
             'auth_method': self.auth_method,
-            'created_at': self.created_at.isoformat()
+            'created_at': self.created_at
         }
 
 
 class Analysis(db.Model):
     """Analysis History Model"""
+    # /api/history reads a user's newest analyses: serve it straight from one index range scan
+    __table_args__ = (
+        db.Index('ix_analysis_user_created', 'user_id', db.desc('created_at')),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     dilemma = db.Column(db.Text, nullable=False)
-    analysis_result = db.Column(db.JSON, nullable=False)
+    # JSONB on Postgres; deferred so history listings never pull the full result
+    analysis_result = db.deferred(db.Column(db.JSON().with_variant(postgresql.JSONB(), 'postgresql'), nullable=False))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     execution_time = db.Column(db.Float)
     
@@ -115,28 +241,177 @@ class Analysis(db.Model):
         return {
             'id': self.id,
             'dilemma': self.dilemma[:200] + '...' if len(self.dilemma) > 200 else self.dilemma,
-            'created_at': self.created_at.isoformat(),
+            'created_at': self.created_at,
             'execution_time': self.execution_time
         }
 
 
 # ========== GEMINI API CONFIGURATION ==========
 API_KEY = os.getenv('GEMINI_API_KEY', 'YOUR_API_KEY_HERE')
-client = genai.Client(api_key=API_KEY)
 # USE THIS STABLE EXPERIMENTAL MODEL (It works right now)
-MODEL_DEEP_ANALYSIS = 'gemini-3-pro-preview'
-MODEL_DECISION = 'gemini-3-pro-preview'
-MODEL_FORMATTER = 'gemini-2.0-flash-exp'
+# One call performs analysis + decision and returns the final JSON
+MODEL_COMMANDER = 'gemini-3-pro-preview'
 
 THINKING_LEVEL_DEEP = 'high'
-THINKING_LEVEL_QUICK = 'low'
 DEFAULT_TEMPERATURE = 1.0
 
+# Served by /api/models and /api/bootstrap
+MODEL_INFO = {
+    'gemini_3_pro_preview': {
+        'name': 'Gemini 3 Pro Preview',
+        'release': 'December 2024',
+        'capability': 'State-of-the-art reasoning + multimodal',
+        'thinking_levels': ['low', 'high'],
+        'context_window': '1M input / 64k output',
+        'knowledge_cutoff': 'January 2025',
+        'temperature_optimal': 1.0,
+        'latency': {'high': '15-60s', 'low': '5-15s'},
+        'pricing': '2-4 per 1M input tokens'
+    }
+}
+
 # Constants
 MAX_DILEMMA_LENGTH = 3000
 MIN_DILEMMA_LENGTH = 20
 MAX_RETRIES = 3
 REQUEST_TIMEOUT = 120
+# Celery's prefork pool kills a child that isn't up within 4s, so the boot-time warm-up must stay well under that
+WARM_UP_TIMEOUT = 1.5
+EVENT_POLL_INTERVAL = 0.5
+PROGRESS_TAIL_CHARS = 600  # streamed output shown in the progress preview
+EVENT_STREAM_TIMEOUT = REQUEST_TIMEOUT * (MAX_RETRIES + 2)
+RESULT_CACHE_TIMEOUT = 86400
+
+# Keep-alive HTTP/2 pool shared by every Gemini call on a worker
+GEMINI_HTTP_LIMITS = httpx.Limits(
+    max_keepalive_connections=50,
+    max_connections=100,
+    keepalive_expiry=60.0
+)
+
+# ========== GEMINI CLIENT (ONE PER EVENT LOOP) ==========
+# Pooled connections belong to the loop that opened them, so the event loop
+# and the client are kept together per thread and rebuilt after a fork.
+_loop_state = threading.local()
+
+
+def _get_loop_state():
+    if getattr(_loop_state, 'pid', None) != os.getpid():
+        _loop_state.pid = os.getpid()
+        _loop_state.loop = asyncio.new_event_loop()
+        _loop_state.client = None
+        _loop_state.http = None
+    return _loop_state
+
+
+def _get_genai_client():
+    """Gemini client for this thread's event loop, reusing one warm HTTP/2 connection"""
+    state = _get_loop_state()
+    if state.client is None:
+        # Imported on first use: the SDK (and its protobuf/grpc deps) is only needed to call Gemini
+        from google import genai
+        from google.genai import types
+        
+        state.http = httpx.AsyncClient(http2=True, limits=GEMINI_HTTP_LIMITS)
+        state.client = genai.Client(
+            api_key=API_KEY,
+            http_options=types.HttpOptions(
+                timeout=REQUEST_TIMEOUT * 1000,
+                httpx_async_client=state.http
+            )
+        )
+    return state.client
+
+
+def _close_loop_state(state):
+    """Close this thread's Gemini client, its HTTP/2 pool and its event loop"""
+    if state.client is not None:
+        state.loop.run_until_complete(state.client.aio.aclose())
+        state.loop.run_until_complete(state.http.aclose())
+    state.loop.close()
+    state.pid = None
+
+
+def run_async(coro):
+    """Run a coroutine on this thread's persistent event loop"""
+    state = _get_loop_state()
+    try:
+        return state.loop.run_until_complete(coro)
+    finally:
+        # Eager mode runs the pipeline inside a web request. Under gevent, threading.local is
+        # per greenlet, so a persistent loop would leak one loop + client + pool per request.
+        if celery.conf.task_always_eager:
+            _close_loop_state(state)
+
+# ========== RESPONSE SCHEMA (GEMINI STRUCTURED OUTPUT) ==========
+# Passed as response_schema so Gemini emits exactly this shape; metadata/input are added server-side
+class CognitiveDistortion(BaseModel):
+    name: str = Field(description='Specific distortion')
+    present: bool
+    description: str = Field(description='One sentence explanation')
+
+
+class AnalysisSection(BaseModel):
+    emotions_detected: List[str] = Field(description='Specific raw emotions', min_length=1)
+    cognitive_distortions: List[CognitiveDistortion] = Field(min_length=1)
+    root_cause: str = Field(description='The deepest psychological cause')
+
+
+class Decision(BaseModel):
+    selected_option: str = Field(description='THE COMMAND - one option, short and absolute')
+    rationale: str = Field(description='Strategic rationale, 2 sentences max')
+    confidence_level: Literal['HIGH', 'MEDIUM', 'LOW']
+
+
+class Mitigation(BaseModel):
+    risk: str = Field(description='Specific risk')
+    strategy: str = Field(description='Tactical mitigation')
+
+
+class RiskManagement(BaseModel):
+    risk_if_ignored: str = Field(description='Brutal downside of inaction')
+    mitigation_strategies: List[Mitigation] = Field(min_length=1)
+
+
+class ImmediateAction(BaseModel):
+    action: str = Field(description='COMMAND: Task to execute now')
+    duration: str = Field(description='e.g. 15 mins')
+
+
+class WeeklyMilestone(BaseModel):
+    action: str = Field(description='COMMAND: Milestone')
+    deadline: str = Field(description='Day of the week')
+
+
+class MonthlyFocus(BaseModel):
+    focus: str = Field(description='30-day strategic goal')
+    description: str = Field(description='What success looks like')
+
+
+class LongTermVision(BaseModel):
+    vision: str = Field(description='6-month identity shift')
+    milestone: str = Field(description='Ultimate transformation goal')
+
+
+class ActionPlan(BaseModel):
+    immediate_today: List[ImmediateAction] = Field(min_length=1)
+    this_week: List[WeeklyMilestone] = Field(min_length=1)
+    one_month: MonthlyFocus
+    long_term: LongTermVision
+
+
+class Affirmation(BaseModel):
+    strengths_recognized: List[str] = Field(min_length=1)
+    capability_message: str = Field(description='Identity-based affirmation')
+
+
+class FullResult(BaseModel):
+    analysis: AnalysisSection
+    decision: Decision
+    risk_management: RiskManagement
+    action_plan: ActionPlan
+    affirmation: Affirmation
+
 
 # ========== SYSTEM PROMPTS ==========
 SYSTEM_PROMPT_ANALYST = """You are Dr. NeuroCommand Synthesis — an elite decision architect and psychological profiler with a mandate to perform DEEP, SURGICAL, HIGH-PRECISION analysis of the user’s dilemma.
@@ -251,10 +526,155 @@ Cold. Assertive. Low tolerance for weakness. Tactical and high-agency.
 You speak like an elite commander addressing a subordinate mission unit.
 """
 
+# Single-call pipeline: the analyst's dissection feeds the commander's orders in one response
+SYSTEM_PROMPT_COMMANDER = SYSTEM_PROMPT_ANALYST + """
+PHASE 2 — once the analysis is complete, switch roles:
+
+""" + SYSTEM_PROMPT_ARBITRATOR + """
+OUTPUT: A single JSON object in the response schema. No Markdown.
+"""
+
+# Per-request user prompt; only the dilemma is substituted
+COMMANDER_PROMPT_TEMPLATE = """DILEMMA FOR DEEP ANALYSIS:
+
+{dilemma}
+
+PART 1 — PERFORM THIS RIGOROUS 8-PART ANALYSIS:
+
+1. CORE DILEMMA EXTRACTION
+2. EMOTIONAL INTELLIGENCE MAP
+3. COGNITIVE DISTORTION AUDIT
+4. ROOT CAUSE ANALYSIS (Extended 5 Whys)
+5. OPTION GENERATION (8-10 Distinct Choices)
+6. MULTI-TIMEFRAME OUTCOME SIMULATION
+7. CONSTRAINT RESOURCE ANALYSIS
+8. VALUES-OUTCOME TRADE-OFFS
+
+PART 2 — ISSUE THE DECISION:
+
+1. DECISION: Pick ONE option. No hedging. No neutrality.
+2. STRATEGIC RATIONALE (2 sentences max).
+3. RISK MATRIX (4–6 items): "Risk: Mitigation".
+4. ACTION PLAN — COMMANDER STYLE: imperative verbs only (Deploy, Execute, Kill, Ship, Audit, Strike, Lock).
+   Immediate (5-minute tasks), This week (2–4 milestones), One month (strategic target), Long term (identity shift).
+5. IDENTITY FRAME: Reinforce who the user is in command language.
+
+OUTPUT RULES:
+- Fill every field of the response schema. No nulls, no empty arrays.
+- Use imperative COMMAND language in every action.
+
+BE SPECIFIC. BE DEEP. BE DIRECT. COMMIT."""
+
+# Built once on first call: GenerateContentConfig is a validated Pydantic model, no need to rebuild per request
+@lru_cache(maxsize=None)
+def commander_config():
+    from google.genai import types
+    
+    return types.GenerateContentConfig(
+        system_instruction=SYSTEM_PROMPT_COMMANDER,
+        response_mime_type='application/json',
+        response_schema=FullResult,
+        thinking_config=types.ThinkingConfig(thinking_level=THINKING_LEVEL_DEEP),
+        temperature=DEFAULT_TEMPERATURE,
+        max_output_tokens=16384,
+        top_p=0.95,
+        top_k=40
+    )
+
 # ========== LOGIN MANAGER USER LOADER ==========
+# Flask-Login already memoizes current_user per request (g._login_user);
+# this short-TTL cache skips the User lookup across requests.
+_user_cache = TTLCache(maxsize=10000, ttl=60)
+_user_cache_lock = threading.Lock()
+
+
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    with _user_cache_lock:
+        user = _user_cache.get(str(user_id))
+    if user is not None:
+        # Attach the cached instance to this request's session without a query
+        return db.session.merge(user, load=False)
+    
+    user = User.query.get(int(user_id))
+    if user is not None:
+        with _user_cache_lock:
+            _user_cache[str(user_id)] = user
+    return user
+
+
+def invalidate_user_cache(user_id):
+    """Drop a user from the loader cache after it changes"""
+    with _user_cache_lock:
+        _user_cache.pop(str(user_id), None)
+
+
+# ========== LAST LOGIN (DEFERRED WRITE) ==========
+# With Redis, logins only queue a timestamp; a beat task batch-writes them off the request path
+LAST_LOGIN_QUEUE_KEY = 'pending_last_login'
+LAST_LOGIN_FLUSH_INTERVAL = 10  # seconds
+
+
+def record_last_login(user):
+    """Queue the login time for the batch writer (Redis) or set it inline (local)"""
+    if redis_client:
+        redis_client.zadd(LAST_LOGIN_QUEUE_KEY, {user.id: time.time()})
+    else:
+        user.last_login = datetime.utcnow()
+
+
+@celery.task
+def flush_last_logins() -> int:
+    """Beat task: write all queued last_login times in one UPDATE"""
+    if not redis_client:
+        return 0
+    
+    # Read and clear in one MULTI/EXEC so logins queued meanwhile aren't lost
+    pipe = redis_client.pipeline()
+    pipe.zrange(LAST_LOGIN_QUEUE_KEY, 0, -1, withscores=True)
+    pipe.delete(LAST_LOGIN_QUEUE_KEY)
+    pending, _ = pipe.execute()
+    
+    if not pending:
+        return 0
+    
+    stamps = {int(user_id): datetime.utcfromtimestamp(ts) for user_id, ts in pending}
+    
+    try:
+        with app.app_context():
+            User.query.filter(User.id.in_(stamps)).update(
+                {User.last_login: db.case(stamps, value=User.id)},
+                synchronize_session=False
+            )
+            db.session.commit()
+    except Exception:
+        # Put them back (keeping any newer login) for the next run
+        redis_client.zadd(LAST_LOGIN_QUEUE_KEY, dict(pending), gt=True)
+        raise
+    
+    return len(stamps)
+
+
+if redis_client:
+    celery.conf.beat_schedule = {
+        'flush-last-logins': {
+            'task': flush_last_logins.name,
+            'schedule': LAST_LOGIN_FLUSH_INTERVAL
+        }
+    }
+
+
+# ========== GOOGLE TOKEN VERIFICATION ==========
+# One shared session: keeps the connection to Google alive and caches the signing certs
+# for as long as Google's Cache-Control allows (hours), instead of refetching them per login.
+# Built on the first Google login so the other routes never import google.auth.
+@lru_cache(maxsize=None)
+def google_auth_request():
+    import requests
+    from cachecontrol import CacheControl
+    from google.auth.transport.requests import Request
+    
+    return Request(session=CacheControl(requests.Session()))
 
 
 # ========== AUTHENTICATION ROUTES ==========
@@ -316,6 +736,7 @@ def register():
         db.session.commit()
         
         login_user(user)
+        invalidate_user_cache(user.id)
         
         logger.info(f'✅ New user registered: {email}')
         
@@ -350,10 +771,14 @@ def login():
                 'message': 'Invalid email or password'
             }), 401
         
-        user.last_login = datetime.utcnow()
-        db.session.commit()
+        # An argon2 rehash is the only write a login itself can leave pending
+        needs_commit = user in db.session.dirty
+        record_last_login(user)
+        if needs_commit or db.session.dirty:
+            db.session.commit()
         
         login_user(user)
+        invalidate_user_cache(user.id)
         
         logger.info(f'✅ User login: {email}')
         
@@ -385,8 +810,10 @@ def google_auth():
             }), 400
         
         # Verify token with Google
+        from google.oauth2.id_token import verify_oauth2_token
+        
         try:
-            idinfo = verify_oauth2_token(token, Request(), os.getenv('GOOGLE_CLIENT_ID'))
+            idinfo = verify_oauth2_token(token, google_auth_request(), os.getenv('GOOGLE_CLIENT_ID'))
             google_id = idinfo['sub']
             email = idinfo['email']
             name = idinfo.get('name', email)
@@ -415,10 +842,17 @@ def google_auth():
                 )
                 db.session.add(user)
         
-        user.last_login = datetime.utcnow()
-        db.session.commit()
+        # Decide before the flush, which empties session.new/dirty
+        needs_commit = user.id is None or user in db.session.dirty
+        if needs_commit:
+            # A new account needs its id before the login time can be queued against it
+            db.session.flush()
+        record_last_login(user)
+        if needs_commit or db.session.dirty:
+            db.session.commit()
         
         login_user(user)
+        invalidate_user_cache(user.id)
         
         logger.info(f'✅ Google OAuth login: {email}')
         
@@ -441,6 +875,7 @@ def google_auth():
 @login_required
 def logout():
     """Logout User"""
+    invalidate_user_cache(current_user.id)
     logout_user()
     logger.info(f'✅ User logout')
     return jsonify({
@@ -462,311 +897,71 @@ def get_profile():
 # ========== ERROR HANDLING DECORATOR ==========
 def handle_genai_errors(func):
     @wraps(func)
-    def wrapper(*args, **kwargs):
+    async def wrapper(*args, **kwargs):
         try:
-            return func(*args, **kwargs)
+            return await func(*args, **kwargs)
         except Exception as e:
             logger.error(f'Gemini API Error in {func.__name__}: {str(e)}\n{traceback.format_exc()}')
             raise
     return wrapper
 
 
-# ========== STAGE 1: DEEP ANALYSIS ==========
-@handle_genai_errors
-def stage1_deep_analysis(user_dilemma: str) -> Tuple[str, str, float]:
-    """STAGE 1: Deep Cognitive Analysis using Gemini 3 Pro"""
-    analysis_prompt = f"""DILEMMA FOR DEEP ANALYSIS:
-
-{user_dilemma}
-
-PERFORM THIS RIGOROUS 8-PART ANALYSIS:
-
-1. CORE DILEMMA EXTRACTION
-2. EMOTIONAL INTELLIGENCE MAP
-3. COGNITIVE DISTORTION AUDIT
-4. ROOT CAUSE ANALYSIS (Extended 5 Whys)
-5. OPTION GENERATION (8-10 Distinct Choices)
-6. MULTI-TIMEFRAME OUTCOME SIMULATION
-7. CONSTRAINT RESOURCE ANALYSIS
-8. VALUES-OUTCOME TRADE-OFFS
-
-BE SPECIFIC. BE DEEP. BE PRECISE. PROVIDE EVIDENCE."""
-
-    try:
-        logger.info('🔍 STAGE 1: Initiating Deep Analysis with Gemini 3 Pro')
-        print('\n🔍 STAGE 1: Deep Psychological Analysis')
-        print(' Model: gemini-3-pro-preview')
-        print(' Thinking Level: high (MAXIMUM reasoning)')
-
-        
-        start_time = time.time()
-        
-        response = client.models.generate_content(
-            model=MODEL_DEEP_ANALYSIS,
-            contents=analysis_prompt,
-            config=types.GenerateContentConfig(
-                system_instruction=SYSTEM_PROMPT_ANALYST,
-                temperature=DEFAULT_TEMPERATURE,
-                max_output_tokens=8192,
-                top_p=0.95,
-                top_k=40
-            )
-        )
-        
-        elapsed = time.time() - start_time
-        analysis_text = response.text
-        
-        logger.info(f'✅ Stage 1 Complete: {elapsed:.1f}s, {len(analysis_text)} chars')
-        print(f' ✅ Analysis Complete ({elapsed:.1f}s)')
-        return analysis_text, MODEL_DEEP_ANALYSIS, elapsed
-        
-    except Exception as e:
-        logger.error(f'❌ Stage 1 failed: {str(e)}')
-        print(f' ❌ Error: {str(e)}')
-        raise
-
-
-# ========== STAGE 2: DECISION ARBITRATION ==========
+# ========== COMMANDER STAGE: ANALYSIS + DECISION IN ONE CALL ==========
 @handle_genai_errors
-def stage2_decision_arbitration(analysis: str, original_dilemma: str) -> Tuple[str, float]:
-    """STAGE 2: Decision Selection using Gemini 3 Deep Think"""
-
-    decision_prompt = f"""
-ANALYSIS CONTEXT:
-
-{analysis[:4000]}...
-
-ORIGINAL DILEMMA:
-
-{original_dilemma}
-
-You are the NeuroCommander — a ruthless, high-IQ executive decision engine. 
-You do NOT comfort. You do NOT negotiate. You issue ORDERS.
-
-YOUR TASK (FOLLOW EXACTLY):
-
-1. DECISION:
-   Pick ONE option. No hedging. No neutrality.
-   Examples:
-   - "KEEP THE JOB. BUY TIME WITH CAPITAL."
-   - "EXECUTE THE TRANSITION. FULL COMMITMENT."
-
-2. STRATEGIC RATIONALE (2 sentences max):
-   Use economic, operational, or psychological efficiency as justification.
-
-3. RISK MATRIX (4–6 items):
-   Format for each: "Risk: Mitigation"
-   Example:
-   - "Burnout spiral: Enforce rest cycles"
-   - "Cash bleed: Cap monthly burn"
-
-4. ACTION PLAN — COMMANDER STYLE:
-   Use ONLY imperative verbs (Deploy, Execute, Kill, Ship, Audit, Strike, Lock).
-   Structure:
-   - Immediate (5-minute tasks)
-   - This week (2–4 milestones)
-   - One month (strategic target)
-   - Long term (identity shift)
-
-5. IDENTITY FRAME:
-   Reinforce who the user is in command language.
-   Example:
-   - "You are not an employee seeking permission. You are a founder allocating resources."
-
-TONE: Cold. Assertive. Tactical. High-agency.
-BE DIRECT. BE BOLD. BE ACTIONABLE. COMMIT.
-"""
+async def commander_analysis_and_decision(user_dilemma: str,
+                                          on_delta: Optional[Callable[[str], None]] = None) -> Tuple[Dict, float]:
+    """Deep Analysis + Decision Arbitration + JSON Output in a single Gemini 3 Pro call (streamed)"""
+    commander_prompt = COMMANDER_PROMPT_TEMPLATE.format_map({'dilemma': user_dilemma})
 
     try:
-        logger.info('⚖️ STAGE 2: Initiating Decision Arbitration')
-        print('\n⚖️ STAGE 2: Decision Arbitration')
-        print(' Model: gemini-3-pro-preview (Deep Think)')
-        print(' Thinking Level: high (SYSTEM 2 reasoning)')
-
+        logger.info('🧠 COMMANDER: Initiating Analysis + Decision with Gemini 3 Pro')
+        logger.debug(f'Model: {MODEL_COMMANDER}, thinking level: {THINKING_LEVEL_DEEP}, output: application/json (streamed)')
         
         start_time = time.time()
         
-        response = client.models.generate_content(
-            model=MODEL_DECISION,
-            contents=decision_prompt,
-            config=types.GenerateContentConfig(
-                system_instruction=SYSTEM_PROMPT_ARBITRATOR,
-                temperature=DEFAULT_TEMPERATURE,
-                max_output_tokens=6000,
-                top_p=0.9,
-                top_k=30
-            )
+        stream = await _get_genai_client().aio.models.generate_content_stream(
+            model=MODEL_COMMANDER,
+            contents=commander_prompt,
+            config=commander_config()
         )
         
-        elapsed = time.time() - start_time
-        decision_text = response.text
-        
-        logger.info(f'✅ Stage 2 Complete: {elapsed:.1f}s')
-        print(f' ✅ Decision Complete ({elapsed:.1f}s)')
-        return decision_text, elapsed
-        
-    except Exception as e:
-        logger.error(f'❌ Stage 2 failed: {str(e)}')
-        print(f' ❌ Error: {str(e)}')
-        raise
-
-
-# ========== STAGE 3: JSON FORMATTING ==========
-@handle_genai_errors
-def stage3_format_to_json(analysis: str, decision: str, dilemma: str) -> Tuple[Dict, float]:
-    """STAGE 3: Convert Narrative to Structured JSON"""
-
-    formatting_prompt = f"""
-You are the NeuroCommander JSON Finalizer — an execution unit whose only job is to convert the analysis and decision into PERFECT, VALID JSON.
-
-INPUTS YOU RECEIVE:
-- Raw dilemma text
-- Analyst output (full reasoning)
-- Commander decision output
-
-YOUR TASK:
-Convert everything into the exact JSON schema below with ZERO deviation.
-
-RULES:
-- No commentary.
-- No Markdown.
-- No extra text.
-- All fields MUST be filled.
-- All arrays MUST contain at least one entry.
-- action_plan.this_week MUST be an array of objects.
-- risk_management.mitigation_strategies MUST be an array of objects.
-- All values MUST be strings, arrays, or objects — no nulls.
-- Temperature = 0 behavior: deterministic, stable, strict schema.
-
-SCHEMA (FOLLOW EXACTLY):
-
-{{
-  "metadata": {{
-    "timestamp": "ISO_8601_UTC",
-    "system": "NeuroCommander v4.0",
-    "sdk": "google-genai",
-    "pipeline": "Analyst → Arbitrator → Finalizer"
-  }},
-  "input": {{
-    "dilemma": "{dilemma}",
-    "dilemma_length": {len(dilemma)}
-  }},
-  "analysis": {{
-    "emotions_detected": ["Specific Emotion 1", "Specific Emotion 2"],
-    "cognitive_distortions": [
-      {{
-        "name": "Specific Distortion",
-        "present": true,
-        "description": "One sentence explanation"
-      }}
-    ],
-    "root_cause": "The deepest psychological cause"
-  }},
-  "decision": {{
-    "selected_option": "THE COMMAND",
-    "rationale": "{decision[:500]}",
-    "confidence_level": "HIGH"
-  }},
-  "risk_management": {{
-    "risk_if_ignored": "Brutal downside of inaction",
-    "mitigation_strategies": [
-      {{
-        "risk": "Specific risk",
-        "strategy": "Tactical mitigation"
-      }}
-    ]
-  }},
-  "action_plan": {{
-    "immediate_today": [
-      {{
-        "action": "COMMAND: Task to execute now",
-        "duration": "15 mins"
-      }}
-    ],
-    "this_week": [
-      {{
-        "action": "COMMAND: Milestone 1",
-        "deadline": "Wednesday"
-      }},
-      {{
-        "action": "COMMAND: Milestone 2",
-        "deadline": "Friday"
-      }}
-    ],
-    "one_month": {{
-      "focus": "30-day strategic goal",
-      "description": "What success looks like"
-    }},
-    "long_term": {{
-      "vision": "6-month identity shift",
-      "milestone": "Ultimate transformation goal"
-    }}
-  }},
-  "affirmation": {{
-    "strengths_recognized": ["Specific Strength"],
-    "capability_message": "Identity-based affirmation"
-  }}
-}}
-
-RETURN ONLY VALID JSON. NO MARKDOWN. NO EXTRA TEXT.
-"""
-
-    # Continue with your existing Gemini call below...
-    # (You do NOT change anything else in this function.)
-
-
-    try:
-        logger.info('📝 STAGE 3: Initiating JSON Formatting')
-        print('\n📝 STAGE 3: JSON Formatter')
-        print(' Model: gemini-2.5-flash')
-        print(' Temperature: 0.0 (deterministic)')
-        print(' Thinking Level: low (speed optimized)')
-        
-        start_time = time.time()
-        
-        response = client.models.generate_content(
-            model=MODEL_FORMATTER,
-            contents=formatting_prompt,
-            config=types.GenerateContentConfig(
-                temperature=0.0,
-                max_output_tokens=4000
-            )
-        )
+        chunks = []
+        async for chunk in stream:
+            if chunk.text:
+                chunks.append(chunk.text)
+                if on_delta:
+                    on_delta(chunk.text)
         
         elapsed = time.time() - start_time
-        json_text = response.text.strip()
-        
-        # Clean markdown wrapper if present
-        if json_text.startswith('```json'):
-            json_text = json_text[7:]
-        if json_text.startswith('```'):
-            json_text = json_text[3:]
-        if json_text.endswith('```'):
-            json_text = json_text[:-3]
-        json_text = json_text.strip()
+        raw_text = ''.join(chunks)
         
-        parsed_json = json.loads(json_text)
+        # Schema violations raise ValidationError, failing the job so Celery retries it
+        result = FullResult.model_validate_json(raw_text)
         
-        logger.info(f'✅ Stage 3 Complete: {elapsed:.1f}s - JSON validated')
-        print(f' ✅ JSON Formatted & Validated ({elapsed:.1f}s)')
-        return parsed_json, elapsed
-        
-    except json.JSONDecodeError as e:
-        logger.error(f'❌ JSON Decode Error: {str(e)}')
-        print(f' ❌ JSON Parse Error: {str(e)}')
-        return {'error': 'JSON parsing failed', 'raw_response': response.text}, 0
+        logger.info(f'✅ Commander Complete: {elapsed:.1f}s - JSON validated')
+        return result.model_dump(), elapsed
         
     except Exception as e:
-        logger.error(f'❌ Stage 3 failed: {str(e)}')
-        print(f' ❌ Error: {str(e)}')
+        logger.error(f'❌ Commander stage failed: {str(e)}')
         raise
 
 
 # ========== NEUROCOMMANDER PIPELINE ==========
-def neurocommander_pipeline(user_dilemma: str) -> Dict:
-    """Execute complete 3-stage pipeline"""
+async def run_pipeline(user_dilemma: str, on_progress: Optional[Callable[[Dict], None]] = None) -> Dict:
+    """Execute the pipeline, reporting streamed output to on_progress"""
     logger.info(f'📥 New request: {len(user_dilemma)} chars')
     
+    # Only the tail of the streamed output is kept: progress stays small however long the answer gets
+    progress = {
+        'completed_stages': 0,
+        'output_tail': ''
+    }
+    
+    def report(**changes):
+        progress.update(changes)
+        if on_progress:
+            on_progress(dict(progress))
+    
     results = {
         'status': 'processing',
         'pipeline_version': '4.0',
@@ -778,48 +973,43 @@ def neurocommander_pipeline(user_dilemma: str) -> Dict:
     }
     
     try:
-        # STAGE 1
-        logger.info('Executing Stage 1: Deep Analysis')
-        analysis, model1, time1 = stage1_deep_analysis(user_dilemma)
-        results['stages'].append({
-            'name': 'Deep Analysis',
-            'model': model1,
-            'thinking_level': THINKING_LEVEL_DEEP,
-            'status': 'complete',
-            'time_seconds': time1
-        })
-        results['timing']['stage1'] = time1
-        
-        # STAGE 2
-        logger.info('Executing Stage 2: Decision Arbitration')
-        decision, time2 = stage2_decision_arbitration(analysis, user_dilemma)
+        # Thinking finishes when the first output chunk arrives
+        logger.info('Executing Commander Stage: Analysis + Decision')
+        final_json, elapsed = await commander_analysis_and_decision(
+            user_dilemma,
+            on_delta=lambda delta: report(
+                completed_stages=1,
+                output_tail=(progress['output_tail'] + delta)[-PROGRESS_TAIL_CHARS:]
+            )
+        )
         results['stages'].append({
-            'name': 'Decision Arbitration',
-            'model': MODEL_DECISION,
+            'name': 'Analysis + Decision',
+            'model': MODEL_COMMANDER,
             'thinking_level': THINKING_LEVEL_DEEP,
             'status': 'complete',
-            'time_seconds': time2
+            'time_seconds': elapsed
         })
-        results['timing']['stage2'] = time2
         
-        # STAGE 3
-        logger.info('Executing Stage 3: JSON Formatting')
-        final_json, time3 = stage3_format_to_json(analysis, decision, user_dilemma)
-        results['stages'].append({
-            'name': 'JSON Formatter',
-            'model': MODEL_FORMATTER,
-            'thinking_level': THINKING_LEVEL_QUICK,
-            'status': 'complete',
-            'time_seconds': time3
-        })
-        results['timing']['stage3'] = time3
+        final_json = {
+            'metadata': {
+                'timestamp': datetime.utcnow().isoformat() + 'Z',
+                'system': 'NeuroCommander v4.0',
+                'sdk': 'google-genai',
+                'pipeline': 'Analyst + Arbitrator (single call)'
+            },
+            'input': {
+                'dilemma': user_dilemma,
+                'dilemma_length': len(user_dilemma)
+            },
+            **final_json
+        }
         
-        total_time = time1 + time2 + time3
-        results['timing']['total'] = total_time
+        results['timing']['commander'] = elapsed
+        results['timing']['total'] = elapsed
         results['status'] = 'success'
         results['final_output'] = final_json
         
-        logger.info(f'✅ Pipeline Complete: {total_time:.1f}s total')
+        logger.info(f'✅ Pipeline Complete: {elapsed:.1f}s total')
         return results
         
     except Exception as e:
@@ -829,6 +1019,81 @@ def neurocommander_pipeline(user_dilemma: str) -> Dict:
         return results
 
 
+def dilemma_cache_key(dilemma: str) -> str:
+    """Result cache key: re-submitted dilemmas differing only in case/outer whitespace share a result"""
+    return 'dilemma:' + hashlib.blake2b(dilemma.strip().lower().encode()).hexdigest()
+
+
+@worker_process_init.connect
+def reset_db_pool(**kwargs):
+    """Forked worker: drop the DB connections inherited from the parent without closing its sockets"""
+    with app.app_context():
+        db.engine.dispose(close=False)
+
+
+@worker_process_init.connect
+def warm_up_gemini(**kwargs):
+    """Open the TLS/HTTP2 connection to Gemini before the worker takes its first job (best effort)"""
+    if API_KEY == 'YOUR_API_KEY_HERE':
+        return
+    try:
+        deadline = time.monotonic() + WARM_UP_TIMEOUT
+        client = _get_genai_client()
+        # Building the client counts against the budget too
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise TimeoutError('client setup used up the warm-up budget')
+        run_async(asyncio.wait_for(client.aio.models.get(model=MODEL_COMMANDER), remaining))
+        logger.info('✅ Gemini connection warmed up')
+    except Exception as e:
+        logger.warning(f'⚠️ Gemini warm-up failed: {str(e) or type(e).__name__}')
+
+
+@celery.task(bind=True, autoretry_for=(Exception,), retry_backoff=True, max_retries=MAX_RETRIES)
+def neurocommander_pipeline(self, user_dilemma: str, user_id: int) -> Dict:
+    """Background task: run the pipeline and save the result to the user's history"""
+    last_published = {'stages': None, 'at': 0.0}
+    
+    def publish_progress(progress):
+        # One result-backend write per poll interval (or stage change), not one per streamed chunk
+        now = time.monotonic()
+        if (progress['completed_stages'] == last_published['stages']
+                and now - last_published['at'] < EVENT_POLL_INTERVAL):
+            return
+        last_published.update(stages=progress['completed_stages'], at=now)
+        self.update_state(state='PROGRESS', meta={**progress, 'user_id': user_id})
+    
+    result = run_async(run_pipeline(user_dilemma, on_progress=publish_progress))
+    
+    if result['status'] != 'success':
+        raise RuntimeError(result.get('error') or 'Pipeline execution failed')
+    
+    with app.app_context():
+        analysis = Analysis(
+            user_id=user_id,
+            dilemma=user_dilemma,
+            analysis_result=result['final_output'],
+            execution_time=result['timing']['total']
+        )
+        db.session.add(analysis)
+        db.session.commit()
+    
+    job_result = {
+        'data': result['final_output'],
+        'timing': result['timing'],
+        'metadata': {
+            'pipeline_version': '4.0',
+            'sdk': 'google-genai Dec 2025',
+            'models': [s['model'] for s in result['stages']],
+            'thinking_configuration': THINKING_LEVEL_DEEP,
+            'api_protocol': 'google.genai.Client',
+            'user_id': user_id
+        }
+    }
+    cache.set(dilemma_cache_key(user_dilemma), job_result, timeout=RESULT_CACHE_TIMEOUT)
+    return job_result
+
+
 # ========== API ROUTES ==========
 
 @app.route('/')
@@ -840,7 +1105,7 @@ def home():
 @app.route('/api/process', methods=['POST'])
 @login_required
 def process_dilemma():
-    """Main API endpoint - Process Dilemma (Requires Authentication)"""
+    """Main API endpoint - Queue Dilemma for Processing (Requires Authentication)"""
     try:
         data = request.json
         dilemma = data.get('dilemma', '').strip()
@@ -858,38 +1123,41 @@ def process_dilemma():
                 'message': f'Dilemma too long (max {MAX_DILEMMA_LENGTH} chars)'
             }), 400
         
-        # Execute pipeline
-        result = neurocommander_pipeline(dilemma)
-        
-        if result['status'] == 'success':
-            # Save to database
+        # Identical dilemma already answered: skip the pipeline entirely
+        started = time.time()
+        cached = cache.get(dilemma_cache_key(dilemma))
+        if cached:
+            data = {**cached['data'], 'input': {'dilemma': dilemma, 'dilemma_length': len(dilemma)}}
             analysis = Analysis(
                 user_id=current_user.id,
                 dilemma=dilemma,
-                analysis_result=result['final_output'],
-                execution_time=result['timing']['total']
+                analysis_result=data,
+                # This request's own (near-zero) time, not the original pipeline run's
+                execution_time=time.time() - started
             )
             db.session.add(analysis)
             db.session.commit()
             
             return jsonify({
                 'status': 'success',
-                'data': result['final_output'],
-                'timing': result['timing'],
-                'metadata': {
-                    'pipeline_version': '4.0',
-                    'sdk': 'google-genai Dec 2025',
-                    'models': [s['model'] for s in result['stages']],
-                    'thinking_configuration': 'high→high→low',
-                    'api_protocol': 'google.genai.Client',
-                    'user_id': current_user.id
-                }
+                'data': data,
+                'timing': cached['timing'],
+                'metadata': {**cached['metadata'], 'user_id': current_user.id, 'cached': True}
             }), 200
-        else:
-            return jsonify({
-                'status': 'error',
-                'message': result.get('error', 'Pipeline execution failed')
-            }), 500
+        
+        # Queue pipeline - client polls /api/process/<job_id>
+        task = neurocommander_pipeline.delay(dilemma, current_user.id)
+        
+        # Eager mode (no REDIS_URL) already ran it, and the result lives only in this process: answer now.
+        # Reload it from the result backend: the EagerResult itself doesn't carry the task args.
+        if task.ready():
+            body, status_code = _job_response(neurocommander_pipeline.AsyncResult(task.id), current_user.id)
+            return jsonify(body), status_code
+        
+        return jsonify({
+            'status': 'queued',
+            'job_id': task.id
+        }), 202
             
     except Exception as e:
         logger.error(f'API Error: {str(e)}')
@@ -899,16 +1167,122 @@ def process_dilemma():
         }), 500
 
 
+@app.route('/api/process/<job_id>', methods=['GET'])
+@login_required
+def process_status(job_id):
+    """Poll a queued pipeline job"""
+    try:
+        task = neurocommander_pipeline.AsyncResult(job_id)
+        body, status_code = _job_response(task, current_user.id)
+        return jsonify(body), status_code
+        
+    except Exception as e:
+        logger.error(f'Job status error: {str(e)}')
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 500
+
+
+def _job_owner(task) -> Optional[int]:
+    """User a job was queued for (its args are stored with the result), None if not known yet"""
+    args = task.args
+    return args[1] if args and len(args) > 1 else None
+
+
+def _job_response(task, user_id: int) -> Tuple[Dict, int]:
+    """Response body and status code for a job's current state, as seen by user_id"""
+    if task.state == 'SUCCESS':
+        result = task.result
+        if result['metadata']['user_id'] != user_id:
+            return {'status': 'error', 'message': 'Not found'}, 404
+        
+        return {
+            'status': 'success',
+            'data': result['data'],
+            'timing': result['timing'],
+            'metadata': result['metadata']
+        }, 200
+    
+    if task.state == 'FAILURE':
+        if _job_owner(task) != user_id:
+            return {'status': 'error', 'message': 'Not found'}, 404
+        
+        return {
+            'status': 'error',
+            'message': str(task.result) or 'Pipeline execution failed'
+        }, 500
+    
+    return {
+        'status': 'processing',
+        'job_status': task.state.lower(),
+        'progress': _job_progress(task, user_id)
+    }, 202
+
+
+def _job_progress(task, user_id: int) -> Optional[Dict]:
+    """Intermediate pipeline output of a running job, if it belongs to user_id"""
+    if task.state != 'PROGRESS' or not isinstance(task.info, dict):
+        return None
+    if task.info.get('user_id') != user_id:
+        return None
+    return {k: v for k, v in task.info.items() if k != 'user_id'}
+
+
+@app.route('/api/process/<job_id>/events', methods=['GET'])
+@login_required
+def process_events(job_id):
+    """Server-Sent Events stream of a queued job: stage output as it arrives, then the result"""
+    user_id = current_user.id
+    # Don't hold a pooled DB connection for the lifetime of the stream
+    db.session.close()
+    
+    def event(payload):
+        return b"data: " + orjson.dumps(payload) + b"\n\n"
+    
+    def generate():
+        sent = {}
+        deadline = time.time() + EVENT_STREAM_TIMEOUT
+        
+        while time.time() < deadline:
+            task = neurocommander_pipeline.AsyncResult(job_id)
+            
+            if task.ready():
+                body, _ = _job_response(task, user_id)
+                yield event(body)
+                return
+            
+            # Only send fields that changed since the last event
+            progress = _job_progress(task, user_id) or {}
+            changes = {k: v for k, v in progress.items() if sent.get(k) != v}
+            if changes:
+                sent.update(changes)
+                yield event({'status': 'processing', 'progress': changes})
+            
+            time.sleep(EVENT_POLL_INTERVAL)
+        
+        yield event({'status': 'error', 'message': 'Timed out waiting for pipeline'})
+    
+    return Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+
+def recent_history(user_id: int) -> List[Dict]:
+    """User's 20 most recent analyses (summary fields)"""
+    analyses = Analysis.query.filter_by(user_id=user_id).order_by(Analysis.created_at.desc()).limit(20).all()
+    return [a.to_dict() for a in analyses]
+
+
 @app.route('/api/history', methods=['GET'])
 @login_required
 def get_history():
     """Get user's analysis history"""
     try:
-        analyses = Analysis.query.filter_by(user_id=current_user.id).order_by(Analysis.created_at.desc()).limit(20).all()
-        
         return jsonify({
             'status': 'success',
-            'history': [a.to_dict() for a in analyses]
+            'history': recent_history(current_user.id)
         }), 200
         
     except Exception as e:
@@ -919,6 +1293,40 @@ def get_history():
         }), 500
 
 
+@app.route('/api/bootstrap', methods=['GET'])
+def bootstrap():
+    """Page-load payload: auth state + model info in one round trip (history only with ?include=history)"""
+    try:
+        include = request.args.get('include', '').split(',')
+        
+        if not current_user.is_authenticated:
+            return jsonify({
+                'status': 'success',
+                'authenticated': False,
+                'user': None,
+                'models': MODEL_INFO
+            }), 200
+        
+        payload = {
+            'status': 'success',
+            'authenticated': True,
+            'user': current_user.to_dict(),
+            'models': MODEL_INFO
+        }
+        # Opt-in: the page doesn't render history, so a plain page load skips the query
+        if 'history' in include:
+            payload['history'] = recent_history(current_user.id)
+        
+        return jsonify(payload), 200
+        
+    except Exception as e:
+        logger.error(f'Bootstrap error: {str(e)}')
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 500
+
+
 @app.route('/api/health', methods=['GET'])
 def health():
     """Health check endpoint"""
@@ -929,9 +1337,7 @@ def health():
         'sdk': 'google-genai Dec 2025',
         'api_protocol': 'google.genai.Client',
         'models': {
-            'analysis': MODEL_DEEP_ANALYSIS,
-            'decision': MODEL_DECISION,
-            'formatter': MODEL_FORMATTER
+            'commander': MODEL_COMMANDER
         },
         'api_configured': 'YES' if API_KEY != 'YOUR_API_KEY_HERE' else 'NO',
         'thinking_levels': ['high', 'low'],
@@ -943,26 +1349,7 @@ def health():
 @app.route('/api/models', methods=['GET'])
 def get_models():
     """Model information endpoint"""
-    return jsonify({
-        'gemini_3_pro_preview': {
-            'name': 'Gemini 3 Pro Preview',
-            'release': 'December 2024',
-            'capability': 'State-of-the-art reasoning + multimodal',
-            'thinking_levels': ['low', 'high'],
-            'context_window': '1M input / 64k output',
-            'knowledge_cutoff': 'January 2025',
-            'temperature_optimal': 1.0,
-            'latency': {'high': '15-60s', 'low': '5-15s'},
-            'pricing': '2-4 per 1M input tokens'
-        },
-        'gemini_2_5_flash': {
-            'name': 'Gemini 2.5 Flash',
-            'release': 'June 2025',
-            'capability': 'Fast, efficient, JSON-friendly',
-            'context_window': '1M input / 64k output',
-            'pricing': '0.10 per 1M input tokens'
-        }
-    }), 200
+    return jsonify(MODEL_INFO), 200
 
 
 # ========== ERROR HANDLERS ==========
@@ -982,6 +1369,19 @@ def server_error(error):
 with app.app_context():
     try:
         db.create_all()
+        # create_all() skips indexes on tables that already exist
+        for index in Analysis.__table__.indexes:
+            index.create(db.engine, checkfirst=True)
+        
+        # create_all() doesn't alter existing columns: upgrade json -> jsonb once
+        if db.engine.dialect.name == 'postgresql':
+            columns = {c['name']: c for c in db.inspect(db.engine).get_columns('analysis')}
+            if not isinstance(columns['analysis_result']['type'], postgresql.JSONB):
+                with db.engine.begin() as conn:
+                    conn.execute(db.text(
+                        'ALTER TABLE analysis ALTER COLUMN analysis_result TYPE jsonb USING analysis_result::jsonb'
+                    ))
+                logger.info('✅ Analysis results migrated to JSONB')
         logger.info('✅ Database tables verified/created')
     except Exception as e:
         logger.error(f'❌ Database Setup Error: {e}')
@@ -1000,11 +1400,9 @@ if __name__ == '__main__':
     print('='*70)
     print(f'SDK: google-genai December 2025')
     print(f'API Protocol: google.genai.Client()')
-    print(f'Primary Model: {MODEL_DEEP_ANALYSIS}')
-    print(f'Decision Model: {MODEL_DECISION}')
-    print(f'Formatter Model: {MODEL_FORMATTER}')
+    print(f'Commander Model: {MODEL_COMMANDER} (analysis + decision + JSON)')
     print(f'API Key Status: {"✅ CONFIGURED" if API_KEY != "YOUR_API_KEY_HERE" else "❌ NOT SET"}')
-    print(f'Thinking Config: {THINKING_LEVEL_DEEP} → {THINKING_LEVEL_DEEP} → {THINKING_LEVEL_QUICK}')
+    print(f'Thinking Config: {THINKING_LEVEL_DEEP}')
     print(f'Default Temperature: {DEFAULT_TEMPERATURE} (Gemini 3 optimal)')
     print('='*70)
     print('✅ Authentication: Email/Password + Google OAuth')
@@ -0,0 +1,24 @@
+import os
+import tempfile
+
+import pytest
+
+# Must be set before main is imported. load_dotenv() never overrides existing variables,
+# so a developer's .env can't point the suite at a real database or Redis broker.
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'neurocommander-test.db')
+os.environ['REDIS_URL'] = ''
+
+import main  # noqa: E402
+
+
+@pytest.fixture
+def client():
+    """Test client on a freshly created throwaway database"""
+    main.app.config['TESTING'] = True
+    with main.app.app_context():
+        main.db.drop_all()
+        main.db.create_all()
+    main._user_cache.clear()
+    main.cache.clear()
+
+    return main.app.test_client()
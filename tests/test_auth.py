@@ -0,0 +1,51 @@
+import pytest
+
+fakeredis = pytest.importorskip('fakeredis')
+
+import main
+from google.oauth2 import id_token
+
+
+@pytest.fixture(autouse=True)
+def redis_mode(monkeypatch):
+    """Redis mode (deferred last_login) with Google token verification stubbed out"""
+    monkeypatch.setattr(main, 'redis_client', fakeredis.FakeRedis())
+    monkeypatch.setattr(id_token, 'verify_oauth2_token', lambda token, request, audience: {
+        'sub': 'google-' + token,
+        'email': token + '@example.com',
+        'name': 'Test User'
+    })
+
+
+def test_google_login_saves_new_user(client):
+    response = client.post('/auth/google', json={'token': 'alice'})
+    assert response.status_code == 200
+    user_id = response.get_json()['user']['id']
+
+    with main.app.app_context():
+        assert main.db.session.get(main.User, user_id).email == 'alice@example.com'
+    assert client.get('/auth/check').get_json()['authenticated'] is True
+    assert main.redis_client.zscore(main.LAST_LOGIN_QUEUE_KEY, user_id) is not None
+
+
+def test_google_login_links_existing_email_account(client):
+    client.post('/auth/register', json={'email': 'bob@example.com', 'password': 'password123', 'name': 'Bob'})
+    client.post('/auth/logout')
+
+    response = client.post('/auth/google', json={'token': 'bob'})
+    assert response.status_code == 200
+
+    with main.app.app_context():
+        user = main.User.query.filter_by(email='bob@example.com').one()
+        assert user.google_id == 'google-bob'
+        assert user.auth_method == 'google'
+
+
+def test_flush_last_logins_writes_queued_logins(client):
+    client.post('/auth/google', json={'token': 'carol'})
+    client.post('/auth/google', json={'token': 'dave'})
+
+    assert main.flush_last_logins() == 2
+    assert main.redis_client.zcard(main.LAST_LOGIN_QUEUE_KEY) == 0
+    with main.app.app_context():
+        assert all(user.last_login for user in main.User.query.all())
@@ -0,0 +1,71 @@
+import pytest
+
+import main
+
+DILEMMA = 'Should I quit my job to start a company this year?'
+
+
+def fake_pipeline(status):
+    """Stand-in for run_pipeline that finishes instantly with the given status"""
+    async def run_pipeline(user_dilemma, on_progress=None):
+        return {
+            'status': status,
+            'stages': [{'model': main.MODEL_COMMANDER}],
+            'timing': {'total': 1.5},
+            'final_output': {'decision': {'selected_option': 'GO'}} if status == 'success' else None,
+            'error': None if status == 'success' else 'Response failed validation'
+        }
+    return run_pipeline
+
+
+@pytest.fixture
+def client(client, monkeypatch):
+    """Logged-in client; failed jobs fail immediately instead of retrying"""
+    monkeypatch.setattr(main.neurocommander_pipeline, 'max_retries', 0)
+    client.post('/auth/register', json={'email': 'a@example.com', 'password': 'password123', 'name': 'A'})
+    return client
+
+
+def test_eager_job_is_answered_directly(client, monkeypatch):
+    monkeypatch.setattr(main, 'run_pipeline', fake_pipeline('success'))
+
+    response = client.post('/api/process', json={'dilemma': DILEMMA})
+
+    assert response.status_code == 200
+    assert response.get_json()['data']['decision']['selected_option'] == 'GO'
+
+
+def test_eager_job_failure_is_reported_to_its_owner(client, monkeypatch):
+    monkeypatch.setattr(main, 'run_pipeline', fake_pipeline('error'))
+
+    response = client.post('/api/process', json={'dilemma': DILEMMA})
+
+    assert response.status_code == 500
+    assert response.get_json()['message'] == 'Response failed validation'
+
+
+def test_failed_job_is_hidden_from_other_users(client, monkeypatch):
+    monkeypatch.setattr(main, 'run_pipeline', fake_pipeline('error'))
+
+    task = main.neurocommander_pipeline.delay(DILEMMA, 1)
+    assert client.get(f'/api/process/{task.id}').status_code == 500
+
+    client.post('/auth/logout')
+    client.post('/auth/register', json={'email': 'b@example.com', 'password': 'password123', 'name': 'B'})
+    response = client.get(f'/api/process/{task.id}')
+
+    assert response.status_code == 404
+    assert 'validation' not in response.get_data(as_text=True)
+
+
+def test_cache_hit_records_its_own_execution_time(client, monkeypatch):
+    monkeypatch.setattr(main, 'run_pipeline', fake_pipeline('success'))
+
+    client.post('/api/process', json={'dilemma': DILEMMA})
+    response = client.post('/api/process', json={'dilemma': DILEMMA.upper()})
+
+    assert response.get_json()['metadata']['cached'] is True
+    with main.app.app_context():
+        first, cached = main.Analysis.query.order_by(main.Analysis.id).all()
+        assert first.execution_time == 1.5
+        assert cached.execution_time < 1